@@ -1,4 +1,3 @@
-import inspect
 import logging
 import os
 import sys
@@ -6,11 +5,13 @@ import sys
 from systemd import journal
 
 _syslog_identifier = "default"
+_use_journal = "JOURNAL_STREAM" in os.environ
 
 
 def init_logging(identifier="default"):
-    global _syslog_identifier
+    global _syslog_identifier, _use_journal
     _syslog_identifier = identifier
+    _use_journal = "JOURNAL_STREAM" in os.environ
 
     logging.basicConfig(
         level=logging.INFO,
@@ -20,18 +21,19 @@ def init_logging(identifier="default"):
 
 
 def log(message, **fields):
-    frame = inspect.currentframe().f_back
+    if not _use_journal:
+        print(f"[{_syslog_identifier}] {message}")
+        return
+
+    frame = sys._getframe(1)
     fields.pop("SYSLOG_IDENTIFIER", None)
 
-    if "JOURNAL_STREAM" in os.environ:
-        journal.send(
-            MESSAGE=message,
-            SYSLOG_IDENTIFIER=_syslog_identifier,
-            PRIORITY=int(fields.pop("PRIORITY", 5)),
-            CODE_FILE=frame.f_globals.get("__file__", "?"),
-            CODE_LINE=frame.f_lineno,
-            CODE_FUNC=frame.f_code.co_name,
-            **fields,
-        )
-    else:
-        print(f"[{_syslog_identifier}] {message}")
+    journal.send(
+        MESSAGE=message,
+        SYSLOG_IDENTIFIER=_syslog_identifier,
+        PRIORITY=int(fields.pop("PRIORITY", 5)),
+        CODE_FILE=frame.f_globals.get("__file__", "?"),
+        CODE_LINE=frame.f_lineno,
+        CODE_FUNC=frame.f_code.co_name,
+        **fields,
+    )
@@ -1,22 +1,28 @@
 #!/usr/bin/env python3
 
 import argparse
+import asyncio
 import re
 import signal
 import socket
-import threading
-import time
+from functools import lru_cache
 
-import redis
+import redis.asyncio as redis
 from log import init_logging, log
 from notifier import Notifier
 
-shutdown_requested = threading.Event()
+shutdown_requested = asyncio.Event()
 
-reply_channel_re = re.compile(r"< REP (\d+) (\S+)\s+(\S+) >")
-reply_device_re = re.compile(r"< REP (\S+)\s+{([^}]*)} >")
-report_re = re.compile(r"< REPORT (\S+)(?: (\S+))?(?: (.+))? >")
-sample_re = re.compile(r"< SAMPLE (\d+) ALL (.+) >")
+REDIS = redis.Redis(connection_pool=redis.BlockingConnectionPool(max_connections=4))
+
+line_re = re.compile(
+    r"^< (?:"
+    r"REP (?:(?P<ch>\d+) )?(?P<dkey>\S+)\s+\{?(?P<dval>[^}]*?)\}?"
+    r"|SAMPLE (?P<sch>\d+) ALL (?P<sraw>.+?)"
+    r"|REPORT (?P<rkey>\S+)(?: (?P<rsub>\S+))?(?: (?P<rrest>.+?))?"
+    r") >$",
+    re.ASCII,
+)
 
 POLL_COMMANDS = [
     "GET DEVICE_NAME",
@@ -61,6 +67,22 @@ POLL_COMMANDS = [
     "GET 2 TX_TALK_SWITCH",
 ]
 
+POLL_BLOB = b"".join(f"< {cmd} >\n".encode("utf-8") for cmd in POLL_COMMANDS)
+POLL_REPLY_KEYS = frozenset(cmd.split(" ", 1)[1] for cmd in POLL_COMMANDS)
+POLL_TIMEOUT = 2.0
+
+SAMPLE_KEYS = (
+    "CHANNEL_QUALITY",
+    "AUDIO_LED_BITMAP",
+    "AUDIO_LEVEL_PEAK",
+    "AUDIO_LEVEL_RMS",
+    "ANTENNA_STATUS",
+    "RSSI_LED_BITMAP_A",
+    "RSSI_A",
+    "RSSI_LED_BITMAP_B",
+    "RSSI_B",
+)
+
 DEVICE_LEVEL_KEYS = {
     "DEVICE_NAME",
     "DEVICE_ID",
@@ -82,7 +104,9 @@ DEVICE_LEVEL_KEYS = {
 
 def parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--host", required=True, help="Device hostname or IP")
+    parser.add_argument(
+        "--host", nargs="+", required=True, help="Device hostname(s) or IP(s)"
+    )
     parser.add_argument("--port", type=int, default=2202, help="TCP control port")
     parser.add_argument(
         "--device", choices=["p10t", "ad4d"], required=True, help="Device type"
@@ -94,215 +118,295 @@ def parse_args():
     return parser.parse_args()
 
 
-def handle_response(host, redis_client, line, device_type):
-    channel_match = reply_channel_re.match(line)
-    device_match = reply_device_re.match(line)
+@lru_cache(maxsize=128)
+def _classify_key(key):
+    if not key.startswith(("AUDIO_IN_LVL_", "AUDIO_LEVEL_")):
+        return key.upper(), None
 
-    if device_match:
-        key = device_match.group(1).strip()
-        value = device_match.group(2).strip()
-        redis_key = f"{host}:device"
-        channel = None
-    elif channel_match:
-        channel = channel_match.group(1).strip()
-        key = channel_match.group(2).strip()
-        value = channel_match.group(3).strip()
+    if key.endswith("_L"):
+        return "AUDIO_LEVEL", "L"
+    elif key.endswith("_R"):
+        return "AUDIO_LEVEL", "R"
+
+    return "AUDIO_LEVEL", None
+
+
+def handle_line(host, pipe, line, base_fields):
+    match = line_re.match(line)
+
+    if not match:
+        log(f"{host}: unparsed line: {line}", PRIORITY=4)
+    elif match["dkey"] is not None:
+        handle_response(
+            host, pipe, match["ch"], match["dkey"], match["dval"].strip(), base_fields
+        )
+
+        return f"{match['ch']} {match['dkey']}" if match["ch"] else match["dkey"]
+    elif match["sch"] is not None:
+        handle_sample(host, pipe, match["sch"], match["sraw"], base_fields)
+    elif match["rkey"].isdigit() and match["rsub"]:
+        value = (match["rrest"] or "").strip("{} ")
+        handle_response(host, pipe, match["rkey"], match["rsub"], value, base_fields)
+    else:
+        value = " ".join(filter(None, (match["rsub"], match["rrest"])))
+        handle_response(
+            host, pipe, None, match["rkey"], value.strip("{} "), base_fields
+        )
+
+
+def handle_response(host, pipe, channel, key, value, base_fields):
+    if channel:
         redis_key = f"{host}:channel:{channel}"
     else:
-        log(f"{host}: unparsed line: {line}", PRIORITY=4)
-        return
+        redis_key = f"{host}:device"
 
-    redis_client.hset(redis_key, key, value)
+    pipe.hset(redis_key, key, value)
+    metric, side = _classify_key(key)
 
     fields = {
+        **base_fields,
         "REDIS_KEY": redis_key,
-        "SHURE_HOST": host,
-        "SHURE_DEVICE": device_type,
         "SHURE_KEY": key,
         "SHURE_VALUE": value,
-        "SHURE_METRIC": key.upper(),
+        "SHURE_METRIC": metric,
     }
 
     if channel:
         fields["SHURE_CHANNEL"] = channel
 
-    if key.startswith("AUDIO_IN_LVL_") or key.startswith("AUDIO_LEVEL_"):
-        fields["SHURE_METRIC"] = "AUDIO_LEVEL"
-
-        if key.endswith("_L"):
-            fields["SHURE_SIDE"] = "L"
-        elif key.endswith("_R"):
-            fields["SHURE_SIDE"] = "R"
+    if side:
+        fields["SHURE_SIDE"] = side
 
     log(f"{redis_key} {key} = {value}", **fields)
 
 
-def handle_sample(host, redis_client, ch_num, raw, device_type):
+def handle_sample(host, pipe, ch_num, raw, base_fields):
     redis_key = f"{host}:channel:{ch_num}"
-    parts = raw.split()
-
-    keys = [
-        "CHANNEL_QUALITY",
-        "AUDIO_LED_BITMAP",
-        "AUDIO_LEVEL_PEAK",
-        "AUDIO_LEVEL_RMS",
-        "ANTENNA_STATUS",
-        "RSSI_LED_BITMAP_A",
-        "RSSI_A",
-        "RSSI_LED_BITMAP_B",
-        "RSSI_B",
-    ]
+    values = dict(zip(SAMPLE_KEYS, raw.split()))
+    pipe.hset(redis_key, mapping=values)
 
-    for k, v in zip(keys, parts[: len(keys)]):
-        redis_client.hset(redis_key, k, v)
+    fields = {
+        **base_fields,
+        "REDIS_KEY": redis_key,
+        "SHURE_CHANNEL": ch_num,
+        "SHURE_METRIC": "SAMPLE",
+    }
 
-        fields = {
-            "REDIS_KEY": redis_key,
-            "SHURE_HOST": host,
-            "SHURE_DEVICE": device_type,
-            "SHURE_CHANNEL": ch_num,
-            "SHURE_KEY": k,
-            "SHURE_VALUE": v,
-            "SHURE_METRIC": k,
-        }
+    for k, v in values.items():
+        fields[f"SHURE_{k}"] = v
 
-        log(f"{redis_key} {k} = {v}", **fields)
+    summary = " ".join(f"{k}={v}" for k, v in values.items())
+    log(f"{redis_key} SAMPLE {summary}", **fields)
 
 
-def init_metering(file):
-    file.write(b"< SET 1 METER_RATE 1000 >\n")
-    file.write(b"< SET 2 METER_RATE 1000 >\n")
-    file.flush()
+async def init_metering(writer):
+    writer.write(b"< SET 1 METER_RATE 1000 >\n")
+    writer.write(b"< SET 2 METER_RATE 1000 >\n")
+    await writer.drain()
 
 
-def run_polling_monitor(sock, host, interval, device_type):
-    redis_client = redis.Redis()
-    file = sock.makefile("rwb", buffering=0)
+async def run_polling_monitor(
+    reader, writer, host, interval, base_fields, redis_client
+):
+    await init_metering(writer)
+    await asyncio.sleep(0.2)
 
-    init_metering(file)
-    time.sleep(0.2)
+    buffer = bytearray()
 
     while not shutdown_requested.is_set():
-        for cmd in POLL_COMMANDS:
-            if not poll_command(file, sock, host, cmd, redis_client, device_type):
-                return
+        pipe = redis_client.pipeline(transaction=False)
+        ok = await poll_all(reader, writer, host, buffer, pipe, base_fields)
+        await pipe.execute()
+
+        if not ok:
+            return
+
+        await asyncio.sleep(interval)
 
-        time.sleep(interval)
 
+async def poll_all(reader, writer, host, buffer, pipe, base_fields):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + POLL_TIMEOUT
+    pending = set(POLL_REPLY_KEYS)
+    answered = 0
 
-def poll_command(file, sock, host, cmd, redis_client, device_type):
     try:
-        file.write(f"< {cmd} >\n".encode("utf-8"))
-        file.flush()
-        time.sleep(0.05)
-        raw = sock.recv(4096)
-    except socket.timeout:
+        writer.write(POLL_BLOB)
+        await writer.drain()
+
+        # Replies come back in command order, interleaved with unsolicited
+        # SAMPLE frames; ERR replies still count towards the total.
+        while answered < len(POLL_COMMANDS):
+            chunk = await asyncio.wait_for(
+                reader.read(65536), timeout=deadline - loop.time()
+            )
+
+            if not chunk:
+                return False
+
+            buffer.extend(chunk)
+            end = buffer.rfind(b">") + 1
+
+            if not end:
+                continue
+
+            for reply in process_raw_data(bytes(buffer[:end]), host, pipe, base_fields):
+                if reply in pending:
+                    pending.discard(reply)
+                    answered += 1
+                elif reply == "ERR":
+                    answered += 1
+
+            del buffer[:end]
+    except asyncio.TimeoutError:
         return True
     except Exception as e:
         log(f"polling error: {e}", PRIORITY=4)
         return False
 
-    process_raw_data(raw, host, redis_client, device_type)
     return True
 
 
-def process_raw_data(raw, host, redis_client, device_type):
-    for part in raw.decode("utf-8", errors="ignore").split("<"):
-        part = part.strip()
+def iter_frames(raw):
+    pos = 0
 
-        if not part:
-            continue
+    while True:
+        lt = raw.find(b"<", pos)
 
-        line = f"< {part}"
-
-        if line.startswith("< SAMPLE"):
-            match = sample_re.match(line)
+        if lt == -1:
+            return
 
-            if match:
-                handle_sample(host, redis_client, *match.groups(), device_type)
+        gt = raw.find(b">", lt)
 
+        if gt == -1:
             return
 
-        handle_response(host, redis_client, line, device_type)
+        yield raw[lt : gt + 1]
+        pos = gt + 1
 
 
-def run_passive_monitor(sock, host, device_type):
-    redis_client = redis.Redis()
-    buffer = b""
+def process_raw_data(raw, host, pipe, base_fields):
+    replies = []
 
-    while not shutdown_requested.is_set():
-        try:
-            chunk = sock.recv(4096)
+    for frame in iter_frames(raw):
+        if frame.startswith(b"< REP ERR"):
+            replies.append("ERR")
 
-            if not chunk:
-                break
+        line = frame.decode("utf-8", errors="ignore")
+        reply = handle_line(host, pipe, line, base_fields)
+
+        if reply:
+            replies.append(reply)
 
-            buffer += chunk
-        except socket.timeout:
-            continue
+    return replies
+
+
+async def run_passive_monitor(reader, host, base_fields, redis_client):
+    while not shutdown_requested.is_set():
+        pipe = redis_client.pipeline(transaction=False)
+        timeout = 2.0
+
+        try:
+            # Wait for the next frame, then keep taking frames that follow
+            # within 50ms so a burst is written to Redis in one round trip.
+            for _ in range(64):
+                frame = await asyncio.wait_for(reader.readuntil(b">"), timeout)
+                line = frame.decode("utf-8", errors="ignore").strip()
+                handle_line(host, pipe, line, base_fields)
+                timeout = 0.05
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.IncompleteReadError:
+            return
         except Exception as e:
             log(f"read error: {e}", PRIORITY=4)
             return
+        finally:
+            await pipe.execute()
+
+
+def enable_keepalive(sock):
+    # Let the kernel notice a dead device within ~10s instead of waiting
+    # on read timeouts for every outstanding command.
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 5)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 2)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, 10_000)
+
 
-        while b"\n" in buffer:
-            line, buffer = buffer.split(b"\n", 1)
-            line = line.decode("utf-8", errors="ignore").strip()
+async def monitor_device(host, port, device_type, interval, notifier, redis_client):
+    base_fields = {"SHURE_HOST": host, "SHURE_DEVICE": device_type}
+    last_status = None
 
-            if line.startswith("< SAMPLE"):
-                match = sample_re.match(line)
+    while not shutdown_requested.is_set():
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, limit=65536), timeout=2
+            )
+            sock = writer.get_extra_info("socket")
+            enable_keepalive(sock)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 262144)
+            log(f"connected to {host}:{port}")
 
-                if match:
-                    handle_sample(host, redis_client, *match.groups(), device_type)
-            else:
-                match = report_re.match(line)
+            if last_status != "connected":
+                notifier.status(f"{host}: connected")
+                last_status = "connected"
 
-                if match:
-                    handle_response(host, redis_client, *match.groups(), device_type)
+            try:
+                if device_type == "ad4d":
+                    await run_polling_monitor(
+                        reader, writer, host, interval, base_fields, redis_client
+                    )
                 else:
-                    log(f"{host}: unparsed line: {line}")
+                    await run_passive_monitor(reader, host, base_fields, redis_client)
+            finally:
+                writer.close()
+        except (OSError, asyncio.TimeoutError) as e:
+            if last_status != "waiting":
+                log(f"{host} unreachable: {e}", PRIORITY=3)
+                notifier.status(f"{host}: waiting for device...")
+                last_status = "waiting"
 
+            await asyncio.sleep(5)
+        except Exception as e:
+            log(f"{host} monitor crashed: {e}", PRIORITY=3)
+            await asyncio.sleep(5)
 
-def main():
-    args = parse_args()
-    init_logging("shure_monitor")
-    notifier = Notifier()
 
-    def handle_signal(signum, _):
+async def run(args, notifier):
+    loop = asyncio.get_running_loop()
+
+    def handle_signal(signum):
         log(f"caught signal {signum} ({signal.Signals(signum).name}), shutting down")
         shutdown_requested.set()
 
-    signal.signal(signal.SIGINT, handle_signal)
-    signal.signal(signal.SIGTERM, handle_signal)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, handle_signal, signum)
+
+    tasks = [
+        asyncio.create_task(
+            monitor_device(host, args.port, args.device, args.interval, notifier, REDIS)
+        )
+        for host in args.host
+    ]
 
     notifier.ready()
-    last_status = None
+    await shutdown_requested.wait()
 
-    while not shutdown_requested.is_set():
-        try:
-            sock = socket.create_connection((args.host, args.port), timeout=2)
-            sock.settimeout(2.0)
-            log(f"connected to {args.host}:{args.port}")
+    for task in tasks:
+        task.cancel()
 
-            if last_status != "connected":
-                notifier.status("connected")
-                last_status = "connected"
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await REDIS.aclose()
 
-            if args.device == "ad4d":
-                run_polling_monitor(sock, args.host, args.interval, args.device)
-            else:
-                run_passive_monitor(sock, args.host, args.device)
 
-            sock.close()
-        except (OSError, socket.error) as e:
-            if last_status != "waiting":
-                log(f"{args.host} unreachable: {e}", PRIORITY=3)
-                notifier.status("waiting for device...")
-                last_status = "waiting"
+def main():
+    args = parse_args()
+    init_logging("shure_monitor")
+    notifier = Notifier()
 
-            time.sleep(5)
-        except Exception as e:
-            log(f"{args.host} monitor crashed: {e}", PRIORITY=3)
-            time.sleep(5)
+    asyncio.run(run(args, notifier))
 
     notifier.stopping()
     log("shutdown complete")
@@ -24,19 +24,17 @@ CHANNEL_GET_SET_KEYS = [
 
 ALL_KEYS = DEVICE_GET_ONLY_KEYS + DEVICE_GET_SET_KEYS + CHANNEL_GET_SET_KEYS
 
+ALL_KEYS_SET = frozenset(ALL_KEYS)
+DEVICE_KEYS_SET = frozenset(DEVICE_GET_ONLY_KEYS + DEVICE_GET_SET_KEYS)
+DEVICE_GET_ONLY_SET = frozenset(DEVICE_GET_ONLY_KEYS)
+
 
 def format_output(data, output_format):
     if output_format == "json":
-        sorted_data = {}
         if isinstance(data, dict):
-            str_keys = sorted([k for k in data.keys() if isinstance(k, str)])
-            int_keys = sorted([k for k in data.keys() if isinstance(k, int)])
-
-            for k in str_keys + int_keys:
-                sorted_data[k] = data[k]
-        else:
-            sorted_data = data
-        return json.dumps(sorted_data, indent=2)
+            # Channel keys are ints; json can't sort them alongside strings.
+            data = {str(k) if isinstance(k, int) else k: v for k, v in data.items()}
+        return json.dumps(data, indent=2, sort_keys=True)
     elif output_format == "pretty":
         return pprint.pformat(data, indent=2, width=80, sort_dicts=True)
     elif output_format == "raw":
@@ -46,8 +44,8 @@ def format_output(data, output_format):
             if not data:
                 return "(no data)"
             lines = []
-            device_keys = sorted([k for k in data.keys() if not str(k).isdigit()])
-            channel_keys = sorted([k for k in data.keys() if str(k).isdigit()], key=int)
+            device_keys = sorted(k for k in data if isinstance(k, str))
+            channel_keys = sorted(k for k in data if isinstance(k, int))
 
             for key in device_keys + channel_keys:
                 value = data[key]
@@ -64,10 +62,10 @@ def format_output(data, output_format):
 def build_command(channel, key):
     key = key.upper()
 
-    if key not in ALL_KEYS:
+    if key not in ALL_KEYS_SET:
         raise ValueError(f"Unknown key: {key}")
 
-    if key in DEVICE_GET_ONLY_KEYS or key in DEVICE_GET_SET_KEYS:
+    if key in DEVICE_KEYS_SET:
         return key
 
     if channel not in ("1", "2"):
@@ -91,92 +89,166 @@ def parse_report_line(line):
     return {"channel": None, parts[1]: parts[2] if len(parts) > 2 else None}
 
 
-def send_command(
-    host, port, command=None, expect_key=None, output_format="text", bulk=False
-):
-    try:
-        with socket.create_connection((host, port), timeout=2) as sock:
-            sock.settimeout(2)
+def report_key(channel, key):
+    return f"{channel} {key}" if channel is not None else key
+
+
+def iter_reports(buf):
+    pos = 0
+
+    while True:
+        lt = buf.find("<", pos)
 
-            if bulk:
-                cmds = [f"GET {k}" for k in DEVICE_GET_ONLY_KEYS]
+        if lt == -1:
+            return
 
-                for ch in ("1", "2"):
-                    cmds.extend(f"GET {ch} {k}" for k in CHANNEL_GET_SET_KEYS)
+        gt = buf.find(">", lt)
 
-                for cmd in cmds:
-                    sock.sendall(f"< {cmd} >\r\n".encode("utf-8"))
-                    time.sleep(0.01)
+        if gt == -1:
+            return
 
-                time.sleep(0.4)
-            else:
-                sock.sendall(f"< {command} >\r\n".encode("utf-8"))
-                time.sleep(0.1)
+        pos = gt + 1
+        parts = buf[lt + 1 : gt].split(None, 2)
+
+        if len(parts) < 3 or parts[0] != "REPORT":
+            continue
+
+        if parts[1] in ("1", "2"):
+            channel = int(parts[1])
+            key, _, value = parts[2].partition(" ")
+        else:
+            channel, key, value = None, parts[1], parts[2]
 
+        value = value.strip().strip("{}").strip()
+
+        if value:
+            yield channel, key, value
+
+
+def send_command_many(host, port, commands, expect_keys):
+    pending = set(expect_keys)
+    values = {}
+
+    with socket.create_connection((host, port), timeout=2) as sock:
+        sock.settimeout(2)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 262144)
+        sock.sendall(b"".join(f"< {cmd} >\r\n".encode("utf-8") for cmd in commands))
+
+        buf = bytearray()
+        scanned = 0
+        end = time.monotonic() + 2
+
+        while pending and time.monotonic() < end:
             try:
-                chunks = []
-                end = time.time() + 0.5
+                chunk = sock.recv(65536)
+            except socket.timeout:
+                break
 
-                while time.time() < end:
-                    try:
-                        chunk = sock.recv(4096)
+            if not chunk:
+                break
 
-                        if not chunk:
-                            break
-                        chunks.append(chunk)
-                    except socket.timeout:
-                        break
+            buf.extend(chunk)
 
-                raw = b"".join(chunks).decode("utf-8", errors="ignore")
+            # Replies are streaming in; give up on any stragglers once the
+            # device has gone quiet for 100ms.
+            sock.settimeout(0.1)
 
-                lines = [
-                    f"< REPORT {part.strip()}"
-                    for part in raw.split("< REPORT ")
-                    if part.strip()
-                ]
+            done = buf.rfind(b">") + 1
+            text = buf[scanned:done].decode("utf-8", errors="ignore")
+            scanned = max(scanned, done)
 
-                if bulk:
-                    result = []
+            for ch, key, value in iter_reports(text):
+                match_key = report_key(ch, key)
 
-                    for line in lines:
-                        parsed = parse_report_line(line)
+                if match_key in pending:
+                    values[match_key] = value
+                    pending.discard(match_key)
 
-                        if parsed:
-                            result.append(parsed)
+    return values
 
-                    merged = {}
 
-                    for entry in result:
-                        ch = entry.pop("channel")
+def fetch_all(host, port):
+    full_keys = list(DEVICE_GET_ONLY_KEYS)
 
-                        if ch is None:
-                            merged.update(entry)
-                        else:
-                            if ch not in merged:
-                                merged[ch] = {}
+    for ch in ("1", "2"):
+        full_keys.extend(build_command(ch, k) for k in CHANNEL_GET_SET_KEYS)
 
-                            merged[ch].update(entry)
-                    return format_output(merged, output_format)
+    values = send_command_many(host, port, [f"GET {k}" for k in full_keys], full_keys)
+    merged = {}
 
-                for line in lines:
-                    parsed = parse_report_line(line)
+    for full_key, value in values.items():
+        ch, _, key = full_key.rpartition(" ")
 
-                    if not parsed:
-                        continue
+        if ch:
+            merged.setdefault(int(ch), {})[key] = value
+        else:
+            merged[key] = value
+
+    return merged
+
+
+def send_command(
+    host,
+    port,
+    command=None,
+    expect_key=None,
+    output_format="text",
+    bulk=False,
+):
+    try:
+        if bulk:
+            return format_output(fetch_all(host, port), output_format)
+
+        with socket.create_connection((host, port), timeout=2) as sock:
+            sock.settimeout(2)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 262144)
+
+            sock.sendall(f"< {command} >\r\n".encode("utf-8"))
+
+            try:
+                buf = bytearray()
+                scanned = 0
+                end = time.monotonic() + 0.3
 
-                    if parsed["channel"] is not None:
-                        match_key = f"{parsed['channel']} {next(k for k in parsed if k != 'channel')}"
-                    else:
-                        match_key = next(k for k in parsed if k != "channel")
+                while time.monotonic() < end:
+                    try:
+                        chunk = sock.recv(65536)
+
+                        if not chunk:
+                            break
+                        buf.extend(chunk)
+
+                        if expect_key is not None:
+                            # Only look at frames completed since the last pass and stop
+                            # as soon as the reply we are waiting for is among them.
+                            done = buf.rfind(b">") + 1
+                            text = buf[scanned:done].decode("utf-8", errors="ignore")
+                            scanned = max(scanned, done)
+
+                            if any(
+                                report_key(ch, key) == expect_key
+                                for ch, key, _ in iter_reports(text)
+                            ):
+                                break
+                    except socket.timeout:
+                        break
+
+                raw = buf.decode("utf-8", errors="ignore")
+
+                for ch, key, value in iter_reports(raw):
+                    match_key = report_key(ch, key)
 
                     if match_key == expect_key:
-                        if bulk or output_format != "text":
-                            return format_output(parsed, output_format)
+                        if output_format != "text":
+                            return format_output(
+                                {"channel": ch, key: value}, output_format
+                            )
                         else:
-                            return next(v for k, v in parsed.items() if k != "channel")
+                            return value
+
                 return (
                     format_output({}, output_format)
-                    if bulk or output_format != "text"
+                    if output_format != "text"
                     else "(no match)"
                 )
             except socket.timeout:
@@ -231,21 +303,18 @@ def main():
 
     if args.get and not args.key:
         if args.channel:
-            result = {}
-            for key in CHANNEL_GET_SET_KEYS:
-                try:
-                    full_key = build_command(args.channel, key)
-                    value = send_command(
-                        args.host,
-                        args.port,
-                        f"GET {full_key}",
-                        expect_key=full_key,
-                        output_format="text",
-                    )
-                    if value and value != "(no match)":
-                        result[key] = value
-                except:
-                    pass
+            keys = CHANNEL_GET_SET_KEYS
+
+            try:
+                full_keys = [build_command(args.channel, k) for k in keys]
+                values = send_command_many(
+                    args.host, args.port, [f"GET {k}" for k in full_keys], full_keys
+                )
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}", file=sys.stderr)
+                sys.exit(1)
+
+            result = {k: values[fk] for k, fk in zip(keys, full_keys) if fk in values}
             print(format_output({int(args.channel): result}, output_format))
         else:
             print(
@@ -262,7 +331,7 @@ def main():
         sys.exit(1)
 
     if args.set:
-        if args.key.upper() in DEVICE_GET_ONLY_KEYS:
+        if args.key.upper() in DEVICE_GET_ONLY_SET:
             print(
                 f"Error: {args.key.upper()} is read-only and cannot be set",
                 file=sys.stderr,
@@ -2,15 +2,69 @@
 
 import argparse
 import asyncio
-from datetime import datetime
+import logging
+import re
+import time
 from textual.app import App, ComposeResult
 from textual.containers import Container, Horizontal, Vertical
-from textual.widgets import Header, Footer, Static, ProgressBar, Label
+from textual.widgets import Header, Footer, Static, Label
 from textual.reactive import reactive
 from textual.timer import Timer
+from textual.logging import TextualHandler
 
-from p10t import send_command as p10t_send_command
-from ad4d import send_command as ad4d_send_command
+logger = logging.getLogger(__name__)
+
+LEVEL_KEYS = {
+    "p10t": (b"AUDIO_IN_LVL_L", b"AUDIO_IN_LVL_R"),
+    "ad4d": (b"AUDIO_LEVEL_PEAK", b"AUDIO_LEVEL_RMS"),
+}
+
+_REP_RE = re.compile(
+    rb"< REP(?:ORT)? (\d+) "
+    rb"(AUDIO_IN_LVL_[LR]|AUDIO_LEVEL_PEAK|AUDIO_LEVEL_RMS) (-?\d+) >"
+)
+
+# Rejected commands get a bare error reply that does not name the channel.
+_ERR_RE = re.compile(rb"< REP(?:ORT)? ERR >")
+
+_RATE_RE = re.compile(rb"< REP(?:ORT)? (\d+) METER_RATE (\d+) >")
+
+# AD4D meter frames: quality, audio LED bitmap, peak, rms, then RF fields.
+_SAMPLE_RE = re.compile(rb"< SAMPLE (\d+) ALL \S+ \S+ (\d+) (\d+) ")
+
+# Silent poll ticks after which polling drops from 10Hz to 2Hz.
+IDLE_TICKS = 30
+
+_TS_CACHE = [0, ""]
+
+
+def _hms():
+    # Displays only need second resolution, so format each second once.
+    t = int(time.time())
+
+    if t != _TS_CACHE[0]:
+        _TS_CACHE[:] = [t, time.strftime("%H:%M:%S", time.localtime(t))]
+
+    return _TS_CACHE[1]
+
+
+class LevelBar(Static):
+    WIDTH = 40
+    MAX_LEVEL = 32767
+
+    def __init__(self, **kwargs):
+        super().__init__(" " * self.WIDTH, **kwargs)
+        self._filled = 0
+
+    def set_level(self, value: int):
+        filled = min(max(value, 0), self.MAX_LEVEL) * self.WIDTH // self.MAX_LEVEL
+
+        # Most level changes don't move the bar by a whole cell.
+        if filled == self._filled:
+            return
+
+        self._filled = filled
+        self.update("█" * filled + " " * (self.WIDTH - filled))
 
 
 class VolumeDisplay(Static):
@@ -23,65 +77,68 @@ class VolumeDisplay(Static):
         self.peak_left = 0
         self.peak_right = 0
         self.last_update = "Never"
+        self._last_ts_update = float("-inf")
 
     def compose(self) -> ComposeResult:
         with Vertical():
             yield Label(f"Channel {self.channel}", classes="channel-title")
             with Horizontal():
                 yield Label("L:", classes="level-label")
-                yield ProgressBar(
-                    total=32767,
-                    show_eta=False,
-                    show_percentage=False,
-                    id=f"left-{self.channel}",
-                )
+                yield LevelBar(id=f"left-{self.channel}")
                 yield Label("0", id=f"left-value-{self.channel}", classes="level-value")
             with Horizontal():
                 yield Label("R:", classes="level-label")
-                yield ProgressBar(
-                    total=32767,
-                    show_eta=False,
-                    show_percentage=False,
-                    id=f"right-{self.channel}",
-                )
+                yield LevelBar(id=f"right-{self.channel}")
                 yield Label(
                     "0", id=f"right-value-{self.channel}", classes="level-value"
                 )
             yield Label(
-                f"Peak: L:{self.peak_left} R:{self.peak_right}",
-                id=f"peak-{self.channel}",
-                classes="peak-info",
-            )
-            yield Label(
-                f"Updated: {self.last_update}",
-                id=f"updated-{self.channel}",
-                classes="update-info",
+                self._info_text(), id=f"info-{self.channel}", classes="peak-info"
             )
 
-    def update_levels(self, left: int, right: int):
-        self.left_level = left
-        self.right_level = right
-        self.peak_left = max(self.peak_left, left)
-        self.peak_right = max(self.peak_right, right)
-        self.last_update = datetime.now().strftime("%H:%M:%S")
-
-        left_bar = self.query_one(f"#left-{self.channel}", ProgressBar)
-        right_bar = self.query_one(f"#right-{self.channel}", ProgressBar)
-        left_bar.update(progress=left)
-        right_bar.update(progress=right)
-
-        self.query_one(f"#left-value-{self.channel}", Label).update(str(left))
-        self.query_one(f"#right-value-{self.channel}", Label).update(str(right))
-        self.query_one(f"#peak-{self.channel}", Label).update(
+    def on_mount(self) -> None:
+        self._left_bar = self.query_one(f"#left-{self.channel}", LevelBar)
+        self._right_bar = self.query_one(f"#right-{self.channel}", LevelBar)
+        self._left_value = self.query_one(f"#left-value-{self.channel}", Label)
+        self._right_value = self.query_one(f"#right-value-{self.channel}", Label)
+        self._info_label = self.query_one(f"#info-{self.channel}", Label)
+
+    def _info_text(self):
+        return (
             f"Peak: L:{self.peak_left} R:{self.peak_right}"
+            f"  •  Updated: {self.last_update}"
         )
-        self.query_one(f"#updated-{self.channel}", Label).update(
-            f"Updated: {self.last_update}"
-        )
+
+    def update_levels(self, left: int, right: int):
+        new_peak = left > self.peak_left or right > self.peak_right
+
+        # Levels often sit still on quiet channels; leave the widgets alone
+        # unless a level moved or set a new peak.
+        if new_peak or left != self.left_level or right != self.right_level:
+            self.left_level = left
+            self.right_level = right
+            self.peak_left = max(self.peak_left, left)
+            self.peak_right = max(self.peak_right, right)
+
+            self._left_bar.set_level(left)
+            self._right_bar.set_level(right)
+            self._left_value.update(str(left))
+            self._right_value.update(str(right))
+
+        now = time.monotonic()
+        stale = now - self._last_ts_update >= 1.0
+
+        if stale:
+            self._last_ts_update = now
+            self.last_update = _hms()
+
+        if new_peak or stale:
+            self._info_label.update(self._info_text())
 
     def reset_peaks(self):
         self.peak_left = 0
         self.peak_right = 0
+        self._info_label.update(self._info_text())
 
 
 class VolumeMonitorApp(App):
@@ -110,19 +167,14 @@ class VolumeMonitorApp(App):
         margin-top: 1;
     }
     
-    .update-info {
-        text-align: center;
-        color: $text-muted;
-        text-style: italic;
-    }
-    
     VolumeDisplay {
         border: solid $primary;
         margin: 1;
         padding: 1;
     }
     
-    ProgressBar {
+    LevelBar {
+        width: auto;
         margin: 0 1;
     }
     """
@@ -139,94 +191,326 @@ class VolumeMonitorApp(App):
         port: int = 2202,
         device_type: str = "p10t",
         channels: list = None,
+        poll: bool = False,
     ):
         super().__init__()
         self.host = host
         self.port = port
         self.device_type = device_type
         self.channels = channels or ([1, 2] if device_type == "p10t" else [1, 2, 3, 4])
+        self.level_keys = LEVEL_KEYS[device_type]
+        self._meter_query = b"".join(
+            b"< GET %d METER_RATE >" % ch for ch in self.channels
+        )
+        self._meter_start = None
+        self._poll_payload = b"".join(
+            b"< GET %d %s >" % (ch, key)
+            for ch in self.channels
+            for key in self.level_keys
+        )
+        self._poll_expected = frozenset(
+            (ch, key) for ch in self.channels for key in self.level_keys
+        )
+        self._poll_timeout = 0.08 * len(self.channels)
+        self._error = False
+        self.poll = poll
         self.paused = False
         self.timer = None
+        self._idle_timer = None
+        self._idle_ticks = 0
+        self._conn = None
+        self._conn_lock = asyncio.Lock()
+        self._reader_task = None
+        self._saved_rates = None
+        self._levels = {}
+        self._pending = {}
+        self._displays = {}
 
     def compose(self) -> ComposeResult:
         yield Header()
         with Container(id="main"):
             for channel in self.channels:
-                yield VolumeDisplay(channel, self.device_type)
+                volume_display = VolumeDisplay(channel, self.device_type)
+                self._displays[channel] = volume_display
+                yield volume_display
         yield Footer()
 
-    def on_mount(self) -> None:
+    async def on_mount(self) -> None:
+        # Network updates only record the latest levels; widgets are redrawn
+        # from them at a steady ~30Hz however fast the device sends.
+        self.set_interval(1 / 30, self._flush_ui)
+
+        if not self.poll:
+            self._reader_task = asyncio.create_task(self._meter_loop())
+            return
+
+        try:
+            await self._connect()
+        except (OSError, asyncio.TimeoutError) as e:
+            self._show_error(e)
+
         self.timer = self.set_interval(0.1, self.update_levels)
+        self._idle_timer = self.set_interval(0.5, self.update_levels, pause=True)
 
-    async def update_levels(self) -> None:
+    async def on_unmount(self) -> None:
+        if self._reader_task:
+            # The task puts the device's METER_RATE back as it is cancelled.
+            self._reader_task.cancel()
+
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+
+        if self._conn:
+            _, writer = self._conn
+            self._conn = None
+            writer.close()
+
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def _connect(self):
+        self._conn = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), timeout=2
+        )
+
+    def _disconnect(self):
+        if self._conn:
+            self._conn[1].close()
+            self._conn = None
+
+    def _show_error(self, error):
+        self._error = True
+
+        if isinstance(error, str):
+            self.sub_title = error
+        else:
+            # TimeoutError and friends carry no message of their own.
+            self.sub_title = f"ERROR: {str(error) or type(error).__name__}"
+
+    def _clear_error(self):
+        if self._error:
+            self._error = False
+            self.sub_title = "PAUSED" if self.paused else "MONITORING"
+
+    async def _meter_loop(self) -> None:
+        # Ask the device to push levels every 100ms and apply them as they
+        # arrive; reconnect and re-arm metering if the connection drops.
+        # METER_RATE is a device setting shared with every other client, so
+        # the original rates are read first and written back on the way out.
+        try:
+            while True:
+                try:
+                    await self._connect()
+                    reader, writer = self._conn
+
+                    if self._saved_rates is None:
+                        self._saved_rates = await self._read_meter_rates()
+                        self._meter_start = b"".join(
+                            b"< SET %d METER_RATE 100 >" % ch
+                            for ch in self._saved_rates
+                        )
+
+                    writer.write(self._meter_start)
+                    await writer.drain()
+
+                    while True:
+                        frame = await asyncio.wait_for(
+                            reader.readuntil(b">"), timeout=2
+                        )
+                        self._handle_meter_frame(frame)
+                        self._clear_error()
+                except (
+                    OSError,
+                    asyncio.TimeoutError,
+                    asyncio.IncompleteReadError,
+                ) as e:
+                    self._show_error(e)
+                    self._disconnect()
+                    await asyncio.sleep(1)
+        finally:
+            await self._restore_meter_rates()
+
+    async def _read_meter_rates(self):
+        reader, writer = self._conn
+        writer.write(self._meter_query)
+        await writer.drain()
+
+        rates = {}
+        answered = 0
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + 2
+
+        # Channels the device rejects answer ERR; they are left alone.
+        while answered < len(self.channels):
+            frame = await asyncio.wait_for(
+                reader.readuntil(b">"), timeout=deadline - loop.time()
+            )
+            match = _RATE_RE.search(frame)
+
+            if match and int(match[1]) in self.channels:
+                rates[int(match[1])] = match[2]
+                answered += 1
+            elif _ERR_RE.search(frame):
+                answered += 1
+            else:
+                self._handle_meter_frame(frame)
+
+        return rates
+
+    async def _restore_meter_rates(self):
+        if not self._saved_rates:
+            return
+
+        restore = b"".join(
+            b"< SET %d METER_RATE %s >" % (ch, rate)
+            for ch, rate in self._saved_rates.items()
+        )
+
+        try:
+            if self._conn is None:
+                await self._connect()
+
+            self._conn[1].write(restore)
+            await asyncio.wait_for(self._conn[1].drain(), timeout=2)
+        except (OSError, asyncio.TimeoutError):
+            pass
+
+    def _handle_meter_frame(self, frame):
         if self.paused:
             return
 
-        print(f"[DEBUG] Updating levels for {len(self.channels)} channels")
+        match = _SAMPLE_RE.search(frame)
+
+        if match:
+            channel, left, right = int(match[1]), int(match[2]), int(match[3])
+        else:
+            match = _REP_RE.search(frame)
+
+            if not match:
+                return
+
+            channel = int(match[1])
+            left, right = self._levels.get(channel, (0, 0))
+
+            if match[2] == self.level_keys[0]:
+                left = int(match[3])
+            else:
+                right = int(match[3])
+
+        self._levels[channel] = (left, right)
+        self._pending[channel] = (left, right)
+
+    async def _fetch_levels(self):
+        # Every channel shares one connection, so only one batch may be
+        # reading from it at a time.
+        async with self._conn_lock:
+            if self._conn is None:
+                await self._connect()
+
+            try:
+                return await self._exchange()
+            except (ConnectionResetError, asyncio.IncompleteReadError):
+                self._disconnect()
+                await self._connect()
+
+                return await self._exchange()
+
+    async def _exchange(self):
+        reader, writer = self._conn
+        writer.write(self._poll_payload)
+        await writer.drain()
+
+        pending = set(self._poll_expected)
+        levels = {}
+        answered = 0
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._poll_timeout
+
+        # Every command gets exactly one reply, ERR included, so the batch
+        # is done once that many have come back.
+        while answered < len(self._poll_expected):
+            frame = await asyncio.wait_for(
+                reader.readuntil(b">"), timeout=deadline - loop.time()
+            )
+            match = _REP_RE.search(frame)
+
+            if match:
+                key = (int(match[1]), match[2])
+                levels[key] = int(match[3])
+
+                if key in pending:
+                    pending.discard(key)
+                    answered += 1
+            elif _ERR_RE.search(frame):
+                answered += 1
+
+        return levels
+
+    async def update_levels(self) -> None:
+        # Drop the tick rather than queue behind a batch that is still
+        # waiting on the device.
+        if self.paused or self._conn_lock.locked():
+            return
+
+        logger.debug("Updating levels for %d channels", len(self.channels))
+
         try:
-            for channel in self.channels:
-                if self.device_type == "p10t":
-                    left_cmd = f"GET {channel} AUDIO_IN_LVL_L"
-                    right_cmd = f"GET {channel} AUDIO_IN_LVL_R"
-
-                    print(f"[DEBUG] Sending P10T commands: {left_cmd}, {right_cmd}")
-                    left_val = p10t_send_command(
-                        self.host,
-                        self.port,
-                        command=left_cmd,
-                        expect_key=f"{channel} AUDIO_IN_LVL_L",
-                        output_format="text",
-                    )
-                    right_val = p10t_send_command(
-                        self.host,
-                        self.port,
-                        command=right_cmd,
-                        expect_key=f"{channel} AUDIO_IN_LVL_R",
-                        output_format="text",
-                    )
-                    print(f"[DEBUG] Got values: L={left_val}, R={right_val}")
-                else:
-                    left_cmd = f"GET {channel} AUDIO_LEVEL_PEAK"
-                    right_cmd = f"GET {channel} AUDIO_LEVEL_RMS"
-
-                    left_val = ad4d_send_command(
-                        self.host,
-                        self.port,
-                        command=left_cmd,
-                        expect_key=f"{channel} AUDIO_LEVEL_PEAK",
-                        output_format="text",
-                    )
-                    right_val = ad4d_send_command(
-                        self.host,
-                        self.port,
-                        command=right_cmd,
-                        expect_key=f"{channel} AUDIO_LEVEL_RMS",
-                        output_format="text",
-                    )
+            levels = await self._fetch_levels()
+        except asyncio.TimeoutError:
+            # The late replies would be read as the next batch's, leaving the
+            # display a tick behind for good; start over on a clean stream.
+            self._disconnect()
+            self._show_error("NETWORK TIMEOUT")
+            return
+        except (OSError, asyncio.IncompleteReadError) as e:
+            self._disconnect()
+            self._show_error(e)
+            return
 
-                try:
-                    left_level = (
-                        int(left_val) if left_val and left_val != "(no match)" else 0
-                    )
-                    right_level = (
-                        int(right_val) if right_val and right_val != "(no match)" else 0
-                    )
-                except (ValueError, TypeError):
-                    left_level = right_level = 0
-
-                volume_display = (
-                    self.query(VolumeDisplay)
-                    .filter(lambda w: w.channel == channel)
-                    .first()
-                )
-                if volume_display:
-                    volume_display.update_levels(left_level, right_level)
+        self._clear_error()
 
-        except Exception as e:
-            self.title = f"Error: {e}"
+        left_key, right_key = self.level_keys
+
+        for channel in self.channels:
+            left_level = levels.get((channel, left_key), 0)
+            right_level = levels.get((channel, right_key), 0)
+            logger.debug("Got values: L=%d, R=%d", left_level, right_level)
+
+            self._pending[channel] = (left_level, right_level)
+
+        self._track_idle(any(levels.values()))
+
+    def _track_idle(self, active):
+        if active:
+            if self._idle_ticks >= IDLE_TICKS:
+                self._idle_timer.pause()
+                self.timer.resume()
+
+            self._idle_ticks = 0
+        else:
+            self._idle_ticks += 1
+
+            if self._idle_ticks == IDLE_TICKS:
+                self.timer.pause()
+                self._idle_timer.resume()
+
+    def _flush_ui(self) -> None:
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+
+        for channel, (left, right) in pending.items():
+            volume_display = self._displays.get(channel)
+            if volume_display:
+                volume_display.update_levels(left, right)
 
     def action_reset_peaks(self) -> None:
-        for volume_display in self.query(VolumeDisplay):
+        for volume_display in self._displays.values():
             volume_display.reset_peaks()
 
     def action_toggle_pause(self) -> None:
@@ -249,12 +533,25 @@ def main():
     parser.add_argument(
         "--channels", nargs="+", type=int, help="Channels to monitor (default: all)"
     )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Poll levels every 100ms instead of having the device push them",
+    )
+    parser.add_argument("--verbose", action="store_true", help="Log debug output")
     args = parser.parse_args()
 
+    if args.verbose:
+        # Textual owns the terminal; route records to its devtools console
+        # (or stderr when no app is running) instead of printing over the UI.
+        logging.basicConfig(level=logging.DEBUG, handlers=[TextualHandler()])
+
     if not args.channels:
         args.channels = [1, 2] if args.device == "p10t" else [1, 2, 3, 4]
 
-    app = VolumeMonitorApp(args.host, args.port, args.device, args.channels)
+    app = VolumeMonitorApp(
+        args.host, args.port, args.device, args.channels, poll=args.poll
+    )
     app.title = f"Volume Monitor - {args.device.upper()} @ {args.host}"
     app.sub_title = "MONITORING"
     app.run()